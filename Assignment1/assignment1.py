@@ -5,92 +5,14 @@ Multiprocessing program that reads and processes fastq files and
 returns a csv file with the average phred scores of these files.
 """
 
+import os
 import sys
 import argparse as ap
-import multiprocessing as mp
-import csv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-def chunks(data, chunks):
-    """
-    Divides the data into multiple chunks for multiprocessing
-    :param data: Quality scores from fastq files
-    :param chunks: Amount of chunks to divide the data into
-    :return: Splitted data
-    """
-    # create list for splitted data and get the size of the file
-    splitted = []
-    size = len(data)
-    # create n amount of chunks
-    for i in range(chunks):
-        # split the data based on chunks and file size
-        start = int(i*size/chunks)
-        end = int((i+1)*size/chunks)
-        splitted.append(data[start:end])
-    return splitted
-
-
-def read_fastq_file(fastq_file):
-    """
-    Reads a fastq file and returns the quality scores from this file
-    :param fastq_file: fastq file
-    :return: quality scores from the given file
-    """
-    quality_scores = []
-    quality = True
-    # open file and loop through
-    with open(fastq_file, encoding='UTF-8') as fastq:
-        # check if quality contains characters, if not end of the file is reached
-        while quality:
-            # skipp files without quality information
-            fastq.readline()
-            fastq.readline()
-            fastq.readline()
-            # strip line
-            quality = fastq.readline().rstrip()
-            # append if it contains info
-            if quality:
-                quality_scores.append(quality)
-    return quality_scores
-
-
-def calculate_quals(quals):
-    """
-    Calculates quality scores
-    :param quals: list of fastq quality score lines
-    :return: quality scores
-    """
-    results = []
-    # loop through quality lines
-    for qual in quals:
-        for i, char in enumerate(qual):
-            # calculate scores
-            try:
-                results[i] += ord(char) - 33
-            except IndexError:
-                results.append(ord(char) - 33)
-    return results
-
-
-def create_output(average_phredscores, csvfile):
-    """
-    Generates csv output files
-    :param average_phredscores: average phredscores calculated from
-    the fastq files
-    :param csvfile: csv output file name
-    """
-    # check if a filename is given
-    if csvfile is None:
-        # write results
-        csv_writer = csv.writer(sys.stdout, delimiter=',')
-        for i, score in enumerate(average_phredscores):
-            csv_writer.writerow([i, score])
-    else:
-        # write results
-        with open(csvfile, 'w', encoding='UTF-8', newline='') as myfastq:
-            csv_writer = csv.writer(myfastq, delimiter=',')
-            for i, score in enumerate(average_phredscores):
-                csv_writer.writerow([i, score])
+from fastqcore import READERS, PhredAccumulator, create_output, make_executor, make_instrumentation, output_file, \
+    process_files
 
 
 def main():
@@ -101,28 +23,27 @@ def main():
                            help="Amount of cores to be used")
     argparser.add_argument("-o", action="store", dest="csvfile", required=False,
                            help="CSV file to save the output. Default is output to terminal STDOUT")
+    argparser.add_argument("--chunks", action="store", type=int, default=4,
+                           help="Amount of chunks to split every file into")
+    argparser.add_argument("--reader", action="store", default='auto', choices=['auto', *READERS],
+                           help="How to read the files. Default picks gzip or text on the extension")
+    argparser.add_argument("--port", action="store", type=int, required=False,
+                           help="Serve the chunks on this port to assignment2 clients instead of "
+                                "processing them with a local pool")
+    argparser.add_argument("--progress", action="store", type=float, required=False, metavar="SECONDS",
+                           help="Report the progress and throughput every SECONDS on STDERR")
+    argparser.add_argument("--profile", action="store", required=False, metavar="FILE",
+                           help="Profile the jobs and write the merged cProfile statistics to FILE")
     argparser.add_argument("fastq_files", action="store",
                            nargs='+', help="At least 1 ILLUMINA fastq file to process")
     args = argparser.parse_args()
-    # loop through files
-    for file in args.fastq_files:
-        qualities = read_fastq_file(file)
-        qualities_chunked = chunks(qualities, 4)
-        # create multiprocessing pools
-        with mp.Pool(args.n) as pool:
-            phredscores = pool.map(calculate_quals, qualities_chunked)
-        # calculate average phredscores
-        phredscores_avg = [sum(i) / len(qualities) for i in zip(*phredscores)]
-        # write output
-        if len(args.fastq_files) > 1:
-            if args.csvfile is None:
-                print(file)
-                csvfile = None
-            else:
-                csvfile = f'{file}.{args.csvfile}'
-        else:
-            csvfile = args.csvfile
-        create_output(phredscores_avg, csvfile)
+    # calculate phredscores of all files
+    executor = make_executor(args.n, args.port, make_instrumentation(args.progress, args.profile))
+    results = process_files(args.fastq_files, [PhredAccumulator], executor, args.chunks, args.reader)
+    # write output
+    for file, (phredscores,) in results.items():
+        csvfile = output_file(file, args.csvfile, len(results))
+        create_output(enumerate(phredscores.result()), csvfile)
 
 
 if __name__ == "__main__":
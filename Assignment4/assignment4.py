@@ -5,90 +5,108 @@ Script that checks for the validity of a given fastq file and returns
 the results to a csv file.
 """
 
+import os
 import sys
-import csv
+import argparse as ap
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-def validate_file(fastq_file):
+from fastqcore import READERS, LengthAccumulator, LocalWorkers, SSHWorkers, ValidationAccumulator, \
+    create_output, find_fastq_files, make_executor, make_instrumentation, process_files, read_hosts, run_batch
+from fastqcore.executors import PORTNUM
+
+HEADER = ["Filenaam,Valide", "Min_length", "Max_length", "Average_length"]
+ACCUMULATORS = [ValidationAccumulator, LengthAccumulator]
+
+
+def validation_rows(results):
+    """
+    Creates the output rows of the validated files
+    :param results: dictionary with the file names as keys and the
+    validation and length accumulators as values
+    :return: validation information of the input files
+    """
+    return [[file, validation.result(), *lengths.result()]
+            for file, (validation, lengths) in results.items()]
+
+
+def validate_files(fastq_files, executor, chunks_count, reader='auto'):
     """
-    Gets a fasq file and checks for the validity by checking the line
-    lengths and the starting characters of lines.
-    :param fastq_file: fastq file to validate
-    :return: validation information of input file
+    Checks the validity of fastq files by checking the line lengths and
+    the starting characters of lines.
+    :param fastq_files: fastq files to validate
+    :param executor: executor to process the chunks on
+    :param chunks_count: Amount of chunks to split every file into
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: validation information of the input files
     """
-    # open fastq file
-    with open(fastq_file, encoding='UTF-8') as fastq:
-        # create variables and parameters
-        valid = True
-        min_length = None
-        max_length = 0
-        counter = 0
-        nuc_line_counter = 0
-        total_length = 0
-        # loop through file
-        while True:
-            # for each line check if the line is empty to see if end is reached
-            # or if the file misses a line
-            header = fastq.readline().rstrip()
-            if len(header) == 0:
-                break
-            nucleotides = fastq.readline().rstrip()
-            if len(nucleotides) == 0:
-                counter += 1
-                break
-            strand = fastq.readline().rstrip()
-            if len(strand) == 0:
-                counter += 2
-                break
-            qual = fastq.readline().rstrip()
-            if len(qual) == 0:
-                counter += 3
-                break
-            # add the minimum length
-            if min_length is None:
-                min_length = len(nucleotides)
-            # if line is shorter, set new minimum length
-            elif min_length > len(nucleotides):
-                min_length = len(nucleotides)
-            # if line is longer, set new maximum length
-            if max_length < len(nucleotides):
-                max_length = len(nucleotides)
-            # collect total length to calculate average
-            total_length += len(nucleotides)
-            nuc_line_counter += 1
-            counter += 4
-            # check if header, nucleotides and quality lines are correct
-            if valid:
-                if not header.startswith("@"):
-                    valid = False
-                if len(nucleotides) != len(qual):
-                    valid = False
-        # check if the file doesn't miss any lines
-        if counter % 4 != 0:
-            valid = False
-        return [fastq_file, valid, min_length, max_length, total_length/nuc_line_counter]
+    return validation_rows(process_files(fastq_files, ACCUMULATORS, executor, chunks_count, reader))
 
 
-def create_output(row):
+def validate_batch(fastq_files, workers, port, split_size, reader='auto', instrumentation=None):
     """
-    Creates csv output from the input file and writes it to the
-    command line output
-    :param row: list object with the filename, minimal line length,
-    maximal line length and average line length.
+    Checks the validity of many fastq files on persistent workers, large
+    files are split and small files packed together.
+    :param fastq_files: fastq files to validate
+    :param workers: SSHWorkers or LocalWorkers to process the files
+    :param port: port to serve the jobs to the workers on
+    :param split_size: size in bytes to aim for per job
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :param instrumentation: optional Instrumentation of the jobs
+    :return: validation information of the input files
     """
-    # generate output
-    header = ["Filenaam,Valide", "Min_length", "Max_length", "Average_length"]
-    csv.writer(sys.stdout, delimiter=",").writerow(header)
-    csv.writer(sys.stdout, delimiter=",").writerow(row)
+    return validation_rows(run_batch(fastq_files, ACCUMULATORS, workers, port, split_size, reader,
+                                     instrumentation))
 
 
-def main(file):
+def main():
     """
     main file to generate output
-    :param file: fastq file
     """
-    create_output(validate_file(file))
+    argparser = ap.ArgumentParser(description="Script for assignment 4 of Big Data Computing",
+                                  fromfile_prefix_chars='@')
+    argparser.add_argument("-n", action="store", dest="n", type=int, default=1,
+                           help="Amount of cores to be used, per host in batch mode")
+    argparser.add_argument("-o", action="store", dest="csvfile", required=False,
+                           help="CSV file to save the output. Default is output to terminal STDOUT")
+    argparser.add_argument("--reader", action="store", default='auto', choices=['auto', *READERS],
+                           help="How to read the files. Default picks gzip or text on the extension")
+    argparser.add_argument("--port", action="store", type=int, required=False,
+                           help="Serve the chunks on this port to assignment2 clients instead of "
+                                "processing them with a local pool, or to the batch workers")
+    argparser.add_argument("--progress", action="store", type=float, required=False, metavar="SECONDS",
+                           help="Report the progress and throughput every SECONDS on STDERR")
+    argparser.add_argument("--profile", action="store", required=False, metavar="FILE",
+                           help="Profile the jobs and write the merged cProfile statistics to FILE")
+    batch_args = argparser.add_argument_group(title="Arguments for batch mode")
+    batch_mode = batch_args.add_mutually_exclusive_group()
+    batch_mode.add_argument("--hosts", action="store", dest="hosts_file",
+                            help="Hosts file to start persistent workers on over ssh, a line "
+                                 "like 4/nuc101 sets the amount of cores for that host")
+    batch_mode.add_argument("--local", action="store", type=int,
+                            help="Start a worker with this amount of cores on this host instead")
+    batch_args.add_argument("--split-size", action="store", type=float, default=64,
+                            help="Size in MB to aim for per job, larger files are split and "
+                                 "smaller files packed together")
+    argparser.add_argument("fastq_files", action="store", nargs='+',
+                           help="At least 1 fastq file or directory with fastq files to validate, "
+                                "@file reads the arguments from a file")
+    args = argparser.parse_args()
+    fastq_files = find_fastq_files(args.fastq_files)
+    instrumentation = make_instrumentation(args.progress, args.profile)
+    if args.hosts_file is not None or args.local is not None:
+        if args.hosts_file is not None:
+            workers = SSHWorkers(read_hosts(args.hosts_file), args.n)
+        else:
+            workers = LocalWorkers(args.local)
+        port = PORTNUM if args.port is None else args.port
+        rows = validate_batch(fastq_files, workers, port, int(args.split_size * 1024 * 1024), args.reader,
+                              instrumentation)
+    else:
+        executor = make_executor(args.n, args.port, instrumentation)
+        rows = validate_files(fastq_files, executor, args.n, args.reader)
+    create_output(rows, args.csvfile, HEADER)
 
 
 if __name__ == "__main__":
-    sys.exit(main(sys.argv[1]))
+    sys.exit(main())
@@ -1,12 +1,20 @@
 #!/usr/local/bin/python3
 
 import csv
+import http.client
+import json
 import sys
+import time
+import urllib.error
+import urllib.request
 
 import pyspark.sql.functions as f
 from pyspark.sql import SparkSession
 from pyspark.sql.window import Window
 
+FINAL_STAGE_STATUSES = ('COMPLETE', 'FAILED', 'SKIPPED')
+STATUS_TIMEOUT = 60
+
 
 def question1(df):
     """
@@ -160,31 +168,229 @@ def question10(df):
     return 10, correlation_coefficient, querry_cleaned._jdf.queryExecution().simpleString()
 
 
-def write_result(result):
+def fetch_json(url):
+    """
+    Fetches and decodes a json document from the Spark monitoring REST api
+    :param url: url of the api endpoint
+    :return: decoded json, or None when the api can't be reached
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return json.load(response)
+    except (OSError, http.client.HTTPException, ValueError):
+        # URLError and timeouts are OSErrors
+        return None
+
+
+def fetch_stage(api, stage_id):
+    """
+    Fetches the attempts of a stage without the details of every task
+    :param api: base url of the application in the monitoring REST api
+    :param stage_id: id of the stage
+    :return: list of stage attempts, or None when the api can't be reached
+    """
+    return fetch_json(f'{api}/stages/{stage_id}?details=false')
+
+
+def stages_final(tracker, group, api, attempts):
+    """
+    Checks whether the status store processed the end of every stage of a
+    job group. Spark updates it asynchronously, so right after an action
+    returns the last stage can still be active and its metrics incomplete.
+    :param tracker: status tracker of the spark context
+    :param group: job group the question ran in
+    :param api: base url of the application in the monitoring REST api,
+    None when the Spark UI is disabled
+    :param attempts: dictionary with the attempts fetched per stage id,
+    stages that finished aren't fetched again
+    :return: True when all stages are complete, failed or skipped
+    """
+    for job_id in tracker.getJobIdsForGroup(group):
+        job = tracker.getJobInfo(job_id)
+        if job is None:
+            continue
+        if job.status == 'RUNNING':
+            return False
+        for stage_id in job.stageIds:
+            if api is None:
+                info = tracker.getStageInfo(stage_id)
+                if info is not None and info.numActiveTasks:
+                    return False
+                continue
+            if attempts.get(stage_id) is None or not stage_final(attempts[stage_id]):
+                attempts[stage_id] = fetch_stage(api, stage_id)
+            if attempts[stage_id] and not stage_final(attempts[stage_id]):
+                return False
+    return True
+
+
+def stage_final(stage_attempts):
+    """
+    :param stage_attempts: attempts of a stage as returned by the REST api
+    :return: True when all attempts are complete, failed or skipped
+    """
+    return all(attempt['status'] in FINAL_STAGE_STATUSES for attempt in stage_attempts)
+
+
+def wait_for_stages(tracker, group, api, timeout=STATUS_TIMEOUT):
+    """
+    Waits until the status store processed the end of every stage of a
+    job group
+    :param tracker: status tracker of the spark context
+    :param group: job group the question ran in
+    :param api: base url of the application in the monitoring REST api
+    :param timeout: seconds to wait at most
+    :return: True when all stages finished, False when the timeout passed,
+    and a dictionary with the last fetched attempts per stage id
+    """
+    attempts = {}
+    deadline = time.monotonic() + timeout
+    while not stages_final(tracker, group, api, attempts):
+        if time.monotonic() > deadline:
+            return False, attempts
+        time.sleep(0.2)
+    return True, attempts
+
+
+def stage_metrics(spark, group):
+    """
+    Collects the metrics of all stages that ran for the jobs in a job group.
+    Shuffle, spill and record counts come from the monitoring REST api,
+    when the Spark UI is disabled only the task counts are available.
+    :param spark: spark session
+    :param group: job group the question ran in
+    :return: list of dictionaries with the metrics per stage and whether
+    all stages finished before the metrics were read
+    """
+    context = spark.sparkContext
+    tracker = context.statusTracker()
+    api = None
+    if context.uiWebUrl:
+        api = f'{context.uiWebUrl}/api/v1/applications/{context.applicationId}'
+    complete, attempts = wait_for_stages(tracker, group, api)
+    stages = []
+    for job_id in tracker.getJobIdsForGroup(group):
+        job = tracker.getJobInfo(job_id)
+        if job is None:
+            continue
+        for stage_id in job.stageIds:
+            info = tracker.getStageInfo(stage_id)
+            stage = {'job': job_id, 'stage': stage_id,
+                     'name': info.name if info else None,
+                     'tasks': info.numTasks if info else None,
+                     'failed_tasks': info.numFailedTasks if info else None}
+            stage_attempts = None
+            if api:
+                # stages after the first unfinished one weren't polled
+                if stage_id not in attempts:
+                    attempts[stage_id] = fetch_stage(api, stage_id)
+                stage_attempts = attempts[stage_id]
+            # stages the api no longer retains only have the tracker info
+            if stage_attempts:
+                stage.update(stage_attempt_metrics(api, stage_id, stage_attempts))
+            stages.append(stage)
+    return stages, complete
+
+
+def stage_attempt_metrics(api, stage_id, attempts):
+    """
+    Sums the REST api metrics of all attempts of a stage and determines the
+    task skew as the ratio between the slowest and the median task
+    :param api: base url of the application in the monitoring REST api
+    :param stage_id: id of the stage
+    :param attempts: stage attempts as returned by the REST api
+    :return: dictionary with the stage metrics
+    """
+    fields = {'executorRunTime': 'run_time_ms',
+              'inputRecords': 'input_records',
+              'outputRecords': 'output_records',
+              'shuffleReadBytes': 'shuffle_read_bytes',
+              'shuffleReadRecords': 'shuffle_read_records',
+              'shuffleWriteBytes': 'shuffle_write_bytes',
+              'shuffleWriteRecords': 'shuffle_write_records',
+              'memoryBytesSpilled': 'memory_spilled_bytes',
+              'diskBytesSpilled': 'disk_spilled_bytes'}
+    metrics = {name: sum(attempt.get(field, 0) for attempt in attempts)
+               for field, name in fields.items()}
+    metrics['attempts'] = len(attempts)
+    # task skew of the last attempt, the one that produced the result
+    attempt = max(attempts, key=lambda stage_attempt: stage_attempt['attemptId'])
+    summary = fetch_json(f'{api}/stages/{stage_id}/{attempt["attemptId"]}'
+                         '/taskSummary?quantiles=0.5,1.0')
+    if summary and summary.get('executorRunTime'):
+        median, slowest = summary['executorRunTime']
+        metrics['task_time_median_ms'] = median
+        metrics['task_time_max_ms'] = slowest
+        metrics['task_skew'] = slowest / median if median else None
+    return metrics
+
+
+def run_question(spark, question, df):
+    """
+    Runs a question in its own job group so the Spark jobs it triggers
+    can be traced back to it, and measures the wall time it takes
+    :param spark: spark session
+    :param question: question function to run
+    :param df: pyspark dataframe
+    :return: result object of the question and its metrics
+    """
+    group = question.__name__
+    spark.sparkContext.setJobGroup(group, f'assignment5 {group}')
+    start = time.perf_counter()
+    result = question(df)
+    wall_time = time.perf_counter() - start
+    stages, complete = stage_metrics(spark, group)
+    metrics = {'question': result[0],
+               'wall_time_s': wall_time,
+               # False when the totals may undercount stages that didn't finish
+               'metrics_complete': complete,
+               'stages': stages,
+               'plan': result[2]}
+    # totals over all stages, the numbers to compare between runs
+    for name in ('run_time_ms', 'input_records', 'shuffle_read_bytes',
+                 'shuffle_write_bytes', 'memory_spilled_bytes', 'disk_spilled_bytes'):
+        metrics[name] = sum(stage.get(name, 0) for stage in stages)
+    metrics['task_skew'] = max((stage['task_skew'] for stage in stages
+                                if stage.get('task_skew') is not None), default=None)
+    return result, metrics
+
+
+def write_results(results, csvfile):
     """
     Writes results of questions to an output csv file
-    :param result: result object containing question number, answer
-    and explanation
+    :param results: list of result objects containing question number,
+    answer and explanation
+    :param csvfile: csv output file name
     """
-    with open("output.csv", 'a', encoding='UTF-8', newline='') as output:
+    with open(csvfile, 'w', encoding='UTF-8', newline='') as output:
         csv_writer = csv.writer(output, dialect='excel')
-        csv_writer.writerow(result)
+        csv_writer.writerows(results)
+
+
+def write_metrics(metrics, jsonfile):
+    """
+    Writes the metrics of the questions to a json file
+    :param metrics: list of dictionaries with the metrics per question
+    :param jsonfile: json output file name
+    """
+    with open(jsonfile, 'w', encoding='UTF-8') as output:
+        json.dump({'questions': metrics}, output, indent=2, default=str)
 
 
 def main(file):
     spark = SparkSession.builder.master('local[16]').appName('assignment5').getOrCreate()
     dataframe = spark.read.csv(file, sep='\t', header=False, inferSchema=True)
-    write_result(question1(dataframe))
-    write_result(question2(dataframe))
-    write_result(question3(dataframe))
-    write_result(question4(dataframe))
-    write_result(question5(dataframe))
-    write_result(question6(dataframe))
-    write_result(question7(dataframe))
-    write_result(question8(dataframe))
-    write_result(question9(dataframe))
-    write_result(question10(dataframe))
+    questions = [question1, question2, question3, question4, question5,
+                 question6, question7, question8, question9, question10]
+    results = []
+    metrics = []
+    for question in questions:
+        result, question_metrics = run_question(spark, question, dataframe)
+        results.append(result)
+        metrics.append(question_metrics)
     spark.stop()
+    write_results(results, "output.csv")
+    write_metrics(metrics, "metrics.json")
 
 
 if __name__ == "__main__":
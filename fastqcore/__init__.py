@@ -0,0 +1,14 @@
+"""
+Shared core of the fastq tools: readers, record batches, chunk planning,
+accumulators, executors, instrumentation, the batch launcher and csv output.
+"""
+
+from .accumulators import Accumulator, LengthAccumulator, PhredAccumulator, ValidationAccumulator
+from .batch import RecordBatch
+from .chunks import Chunk, chunk_size, plan_chunks
+from .executors import DistributedExecutor, LocalExecutor, make_executor, run_client
+from .instrumentation import Instrumentation, make_instrumentation
+from .launcher import LocalWorkers, SSHWorkers, find_fastq_files, plan_jobs, read_hosts, run_batch
+from .output import create_output, output_file
+from .processing import merge_results, process_chunk, process_chunks, process_files
+from .readers import READERS, iter_batches, iter_records, open_reader
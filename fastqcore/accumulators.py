@@ -0,0 +1,190 @@
+"""
+Accumulators that collect statistics from fastq records. Every chunk
+gets its own accumulators, which are merged after processing.
+"""
+
+from .batch import QUALITY, SEQUENCE
+
+
+class Accumulator:
+    """
+    Base class of the accumulators.
+    """
+
+    def add(self, record):
+        """
+        Adds a record to the statistics
+        :param record: (header, sequence, plus, quality) tuple of bytes
+        """
+        raise NotImplementedError
+
+    def add_batch(self, batch):
+        """
+        Adds all records of a batch to the statistics, accumulators
+        override this to work on the buffers of the batch directly
+        :param batch: RecordBatch
+        """
+        for record in batch:
+            self.add(record)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another accumulator of the same type
+        :param other: accumulator of another chunk
+        :return: this accumulator
+        """
+        raise NotImplementedError
+
+    def result(self):
+        """
+        :return: the collected statistics
+        """
+        raise NotImplementedError
+
+
+class PhredAccumulator(Accumulator):
+    """
+    Sums the phred scores per position of the quality lines.
+    """
+
+    def __init__(self):
+        self.sums = []
+        self.count = 0
+
+    def add(self, record):
+        quality = record[3]
+        # skip records without quality information
+        if not quality:
+            return
+        sums = self.sums
+        if len(quality) > len(sums):
+            sums.extend([0] * (len(quality) - len(sums)))
+        for i, score in enumerate(quality):
+            sums[i] += score - 33
+        self.count += 1
+
+    def add_batch(self, batch):
+        # group the quality lines on length, so the scores can be summed
+        # per position with zip instead of per character
+        qualities_by_length = {}
+        for quality in batch.lines(QUALITY):
+            if quality:
+                qualities_by_length.setdefault(len(quality), []).append(bytes(quality))
+        sums = self.sums
+        for length, qualities in qualities_by_length.items():
+            if length > len(sums):
+                sums.extend([0] * (length - len(sums)))
+            offset = 33 * len(qualities)
+            for i, column in enumerate(zip(*qualities)):
+                sums[i] += sum(column) - offset
+            self.count += len(qualities)
+
+    def merge(self, other):
+        if len(other.sums) > len(self.sums):
+            self.sums.extend([0] * (len(other.sums) - len(self.sums)))
+        for i, score in enumerate(other.sums):
+            self.sums[i] += score
+        self.count += other.count
+        return self
+
+    def result(self):
+        """
+        :return: average phred score per position over all reads
+        """
+        if not self.count:
+            return []
+        return [score / self.count for score in self.sums]
+
+
+class LengthAccumulator(Accumulator):
+    """
+    Collects the minimal, maximal and total length of the sequences of
+    complete records.
+    """
+
+    def __init__(self):
+        self.min_length = None
+        self.max_length = 0
+        self.total_length = 0
+        self.count = 0
+
+    def add(self, record):
+        # incomplete records at the end of a file don't count
+        if not record[3]:
+            return
+        length = len(record[1])
+        if self.min_length is None or self.min_length > length:
+            self.min_length = length
+        if self.max_length < length:
+            self.max_length = length
+        self.total_length += length
+        self.count += 1
+
+    def add_batch(self, batch):
+        for length, quality_length in zip(batch.lengths(SEQUENCE), batch.lengths(QUALITY)):
+            if not quality_length:
+                continue
+            if self.min_length is None or self.min_length > length:
+                self.min_length = length
+            if self.max_length < length:
+                self.max_length = length
+            self.total_length += length
+            self.count += 1
+
+    def merge(self, other):
+        if self.min_length is None or (other.min_length is not None
+                                       and self.min_length > other.min_length):
+            self.min_length = other.min_length
+        self.max_length = max(self.max_length, other.max_length)
+        self.total_length += other.total_length
+        self.count += other.count
+        return self
+
+    def result(self):
+        """
+        :return: minimal, maximal and average sequence length
+        """
+        average = self.total_length / self.count if self.count else None
+        return [self.min_length, self.max_length, average]
+
+
+class ValidationAccumulator(Accumulator):
+    """
+    Checks that records are complete, that headers start with '@' and
+    that sequence and quality lines have the same length.
+    """
+
+    def __init__(self):
+        self.valid = True
+
+    def add(self, record):
+        if not self.valid:
+            return
+        header, sequence, plus, quality = record
+        if not (sequence and plus and quality):
+            # the file misses lines
+            self.valid = False
+        elif not header.startswith(b'@') or len(sequence) != len(quality):
+            self.valid = False
+
+    def add_batch(self, batch):
+        if not self.valid:
+            return
+        data, offsets = batch.data, batch.offsets
+        for i in range(0, len(offsets) - 1, 4):
+            header, sequence, plus, quality, end = offsets[i:i + 5]
+            # empty lines mean the file misses lines
+            if (sequence == header or plus == sequence or quality == plus or end == quality
+                    or data[header] != ord('@') or plus - sequence != end - quality):
+                self.valid = False
+                return
+
+    def merge(self, other):
+        self.valid = self.valid and other.valid
+        return self
+
+    def result(self):
+        """
+        :return: whether all records are valid
+        """
+        return self.valid
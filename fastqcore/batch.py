@@ -0,0 +1,99 @@
+"""
+Compact batches of fastq records. A batch keeps the stripped lines of N
+records in one contiguous byte buffer with an array of offsets, instead
+of four bytes objects per record.
+"""
+
+from array import array
+import pickle
+
+HEADER, SEQUENCE, PLUS, QUALITY = range(4)
+
+
+class RecordBatch:
+    """
+    Batch of fastq records. Line j of record i is
+    data[offsets[4 * i + j]:offsets[4 * i + j + 1]], lines missing at the
+    end of a file are empty. Batches pickle their buffers out of band
+    with pickle protocol 5, so a buffer_callback can transfer them
+    between processes without copying.
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data=None, offsets=None):
+        """
+        :param data: byte buffer with the lines, a new bytearray by default
+        :param offsets: offsets of the lines in the buffer, starting with 0
+        """
+        self.data = bytearray() if data is None else data
+        self.offsets = array('Q', [0]) if offsets is None else offsets
+
+    def append(self, header, sequence, plus, quality):
+        """
+        Adds a record to the batch
+        :param header: stripped header line
+        :param sequence: stripped sequence line
+        :param plus: stripped plus line
+        :param quality: stripped quality line
+        """
+        if not isinstance(self.data, bytearray):
+            # unpickled batches share the received buffers, copy them
+            # before growing the batch
+            self.data = bytearray(self.data)
+            self.offsets = array('Q', self.offsets)
+        for line in (header, sequence, plus, quality):
+            self.data += line
+            self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return (len(self.offsets) - 1) // 4
+
+    def __getitem__(self, index):
+        """
+        :param index: index of the record
+        :return: (header, sequence, plus, quality) tuple of bytes
+        """
+        if not 0 <= index < len(self):
+            raise IndexError('record index out of range')
+        data, offsets = self.data, self.offsets
+        i = 4 * index
+        return tuple(bytes(data[offsets[j]:offsets[j + 1]]) for j in range(i, i + 4))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def lines(self, field):
+        """
+        :param field: HEADER, SEQUENCE, PLUS or QUALITY
+        :return: generator of memoryviews of that line of every record
+        """
+        data, offsets = memoryview(self.data), self.offsets
+        for i in range(field, len(offsets) - 1, 4):
+            yield data[offsets[i]:offsets[i + 1]]
+
+    def lengths(self, field):
+        """
+        :param field: HEADER, SEQUENCE, PLUS or QUALITY
+        :return: generator of the length of that line of every record
+        """
+        offsets = self.offsets
+        for i in range(field, len(offsets) - 1, 4):
+            yield offsets[i + 1] - offsets[i]
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return rebuild, (pickle.PickleBuffer(self.data), pickle.PickleBuffer(self.offsets))
+        return rebuild, (bytes(self.data), self.offsets.tobytes())
+
+
+def rebuild(data, offsets):
+    """
+    Recreates a pickled RecordBatch on top of the received buffers,
+    without copying them
+    :param data: byte buffer with the lines
+    :param offsets: buffer with the offsets of the lines
+    :return: RecordBatch
+    """
+    return RecordBatch(memoryview(data).cast('B'), memoryview(offsets).cast('B').cast('Q'))
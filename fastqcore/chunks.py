@@ -0,0 +1,45 @@
+"""
+Chunk planner that divides fastq files into byte ranges which can be
+processed independently.
+"""
+
+import collections
+import os
+
+from .readers import reader_name
+
+Chunk = collections.namedtuple('Chunk', ['path', 'start', 'end', 'reader'])
+
+
+def plan_chunks(fastq_file, chunks_count, reader='auto'):
+    """
+    Divides a fastq file into n amount of chunks of about equal size.
+    The chunk borders are aligned to records when the chunks are read.
+    Compressed files can't be split and become a single chunk.
+    :param fastq_file: fastq file
+    :param chunks_count: Amount of chunks to split the file into
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: list of Chunk objects
+    """
+    reader = reader_name(fastq_file, reader)
+    if reader == 'gzip':
+        return [Chunk(fastq_file, 0, None, reader)]
+    size = os.path.getsize(fastq_file)
+    # small files don't get more chunks than bytes
+    chunks_count = max(1, min(chunks_count, size))
+    chunks = []
+    for i in range(chunks_count):
+        start = i * size // chunks_count
+        end = (i + 1) * size // chunks_count
+        chunks.append(Chunk(fastq_file, start, end, reader))
+    return chunks
+
+
+def chunk_size(chunk):
+    """
+    :param chunk: Chunk of a fastq file
+    :return: size of the chunk in bytes, for compressed files the size on disk
+    """
+    if chunk.end is None:
+        return os.path.getsize(chunk.path)
+    return chunk.end - chunk.start
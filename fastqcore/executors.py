@@ -0,0 +1,247 @@
+"""
+Executors that map a function over jobs, either on a local pool of
+processes or through a server that hands the jobs out to clients
+running on other hosts. Status messages go to STDERR, as the tools
+write their csv output to STDOUT.
+"""
+
+import multiprocessing as mp
+from multiprocessing.managers import BaseManager
+import queue
+import sys
+import time
+
+from .instrumentation import run_job, set_events
+
+POISONPILL = "MEMENTOMORI"
+ERROR = "DOH"
+PORTNUM = 1444
+AUTHKEY = b'whathasitgotinitspocketsesss?'
+
+
+class LocalExecutor:
+    """
+    Runs the jobs on a pool of processes on this host.
+    """
+
+    def __init__(self, processes, instrumentation=None):
+        self.processes = processes
+        self.instrumentation = instrumentation
+
+    def map(self, fn, args, sizes=None):
+        """
+        :param fn: function to call on every job
+        :param args: list of job arguments
+        :param sizes: optional list of the sizes in bytes of the jobs
+        :return: list of results in the order of the jobs
+        """
+        if self.instrumentation is not None:
+            return self.instrumented_map(fn, args, sizes)
+        # a single process doesn't need the overhead of a pool
+        if self.processes == 1:
+            return list(map(fn, args))
+        with mp.Pool(self.processes) as pool:
+            return pool.map(fn, args)
+
+    def instrumented_map(self, fn, args, sizes=None):
+        instrumentation = self.instrumentation
+        jobs = instrumentation.wrap(fn, args)
+        results = [None] * len(jobs)
+        # the workers only report the start of jobs when there are progress reports
+        events = mp.Queue() if instrumentation.interval is not None else None
+        instrumentation.start(len(jobs), sizes, events)
+        try:
+            if self.processes == 1:
+                set_events(events)
+                for job in jobs:
+                    job_id, results[job_id], stats = run_job(job)
+                    instrumentation.done(job_id, stats)
+                set_events(None)
+            else:
+                with mp.Pool(self.processes, initializer=set_events, initargs=(events,)) as pool:
+                    for job_id, result, stats in pool.imap_unordered(run_job, jobs):
+                        results[job_id] = result
+                        instrumentation.done(job_id, stats)
+        finally:
+            instrumentation.finish()
+        return results
+
+
+class DistributedExecutor:
+    """
+    Serves the jobs on a port, clients started with run_client connect to
+    it and process the jobs with their own worker processes. When workers
+    are given the executor starts them itself once the jobs are queued.
+    """
+
+    def __init__(self, port=PORTNUM, authkey=AUTHKEY, workers=None, instrumentation=None):
+        self.port = port
+        self.authkey = authkey
+        self.workers = workers
+        self.instrumentation = instrumentation
+
+    def map(self, fn, args, sizes=None):
+        """
+        :param fn: function to call on every job, must be importable by
+        the clients
+        :param args: list of job arguments
+        :param sizes: optional list of the sizes in bytes of the jobs
+        :return: list of results in the order of the jobs
+        """
+        if not args:
+            print("Gimme something to do here!", file=sys.stderr)
+            return []
+        manager = make_server_manager(self.port, self.authkey)
+        shared_job_q = manager.get_job_q()
+        shared_result_q = manager.get_result_q()
+
+        instrumentation = self.instrumentation
+        print("Sending data!", file=sys.stderr)
+        if instrumentation is None:
+            for i, arg in enumerate(args):
+                shared_job_q.put({'id': i, 'fn': fn, 'arg': arg})
+        else:
+            for job in instrumentation.wrap(fn, args):
+                shared_job_q.put({'id': job[0], 'fn': run_job, 'arg': job})
+            events = manager.get_event_q() if instrumentation.interval is not None else None
+            instrumentation.start(len(args), sizes, events)
+        if self.workers is not None:
+            self.workers.start(self.port)
+
+        results = [None] * len(args)
+        try:
+            for _ in args:
+                result = self.get_result(manager, shared_result_q)
+                if result['result'] == ERROR:
+                    manager.shutdown()
+                    raise RuntimeError(f"Job {result['job']['id']} failed on a client")
+                if instrumentation is None:
+                    results[result['job']['id']] = result['result']
+                else:
+                    job_id, results[job_id], stats = result['result']
+                    instrumentation.done(job_id, stats)
+        finally:
+            if instrumentation is not None:
+                instrumentation.finish()
+        print("Got all results!", file=sys.stderr)
+        # Tell the client process no more data will be forthcoming
+        shared_job_q.put(POISONPILL)
+        if self.workers is not None:
+            self.workers.join()
+        else:
+            # Sleep a bit before shutting down the server - to give clients time to
+            # realize the job queue is empty and exit in an orderly way.
+            time.sleep(5)
+        manager.shutdown()
+        return results
+
+    def get_result(self, manager, result_q):
+        """
+        Waits for the next result, giving up when the started workers all
+        stopped before finishing the jobs
+        :param manager: server manager
+        :param result_q: shared result queue
+        :return: result of a job
+        """
+        while True:
+            try:
+                return result_q.get(timeout=5)
+            except queue.Empty:
+                if self.workers is not None and not self.workers.alive():
+                    manager.shutdown()
+                    raise RuntimeError("All workers stopped before the jobs were done")
+
+
+def make_executor(processes, port=None, instrumentation=None):
+    """
+    Creates the executor for the command line options of the tools
+    :param processes: amount of processes for the local pool
+    :param port: port to serve the jobs on, None to run them locally
+    :param instrumentation: optional Instrumentation of the jobs
+    :return: executor
+    """
+    if port is None:
+        return LocalExecutor(processes, instrumentation)
+    return DistributedExecutor(port, instrumentation=instrumentation)
+
+
+def make_server_manager(port, authkey):
+    """ Create a manager for the server, listening on the given port.
+        Return a manager object with get_job_q and get_result_q methods.
+    """
+    job_q = queue.Queue()
+    result_q = queue.Queue()
+    event_q = queue.Queue()
+
+    # This is based on the examples in the official docs of multiprocessing.
+    # get_{job|result}_q return synchronized proxies for the actual Queue
+    # objects.
+    class QueueManager(BaseManager):
+        pass
+
+    QueueManager.register('get_job_q', callable=lambda: job_q)
+    QueueManager.register('get_result_q', callable=lambda: result_q)
+    QueueManager.register('get_event_q', callable=lambda: event_q)
+
+    manager = QueueManager(address=('', port), authkey=authkey)
+    manager.start()
+    print('Server started at port %s' % port, file=sys.stderr)
+    return manager
+
+
+def make_client_manager(ip, port, authkey):
+    """ Create a manager for a client. This manager connects to a server on the
+        given address and exposes the get_job_q and get_result_q methods for
+        accessing the shared queues from the server.
+        Return a manager object.
+    """
+    class ServerQueueManager(BaseManager):
+        pass
+
+    ServerQueueManager.register('get_job_q')
+    ServerQueueManager.register('get_result_q')
+    ServerQueueManager.register('get_event_q')
+
+    manager = ServerQueueManager(address=(ip, port), authkey=authkey)
+    manager.connect()
+
+    print('Client connected to %s:%s' % (ip, port), file=sys.stderr)
+    return manager
+
+
+def run_client(ip, port, num_processes, authkey=AUTHKEY):
+    manager = make_client_manager(ip, port, authkey)
+    job_q = manager.get_job_q()
+    result_q = manager.get_result_q()
+    event_q = manager.get_event_q()
+    run_workers(job_q, result_q, num_processes, event_q)
+
+
+def run_workers(job_q, result_q, num_processes, event_q=None):
+    processes = []
+    for p in range(num_processes):
+        temP = mp.Process(target=peon, args=(job_q, result_q, event_q))
+        processes.append(temP)
+        temP.start()
+    print("Started %s workers!" % len(processes), file=sys.stderr)
+    for temP in processes:
+        temP.join()
+
+
+def peon(job_q, result_q, event_q=None):
+    my_name = mp.current_process().name
+    # jobs of servers with progress reports report their start on the event queue
+    set_events(event_q)
+    while True:
+        # wait for the next job instead of polling the server
+        job = job_q.get()
+        if job == POISONPILL:
+            job_q.put(POISONPILL)
+            print("Aaaaaaargh", my_name, file=sys.stderr)
+            return
+        try:
+            result = job['fn'](job['arg'])
+            result_q.put({'job': job, 'result': result})
+        except Exception as error:
+            print("Can't do yer fun Bob!", error, file=sys.stderr)
+            result_q.put({'job': job, 'result': ERROR})
@@ -0,0 +1,270 @@
+"""
+Instrumentation of the executors: a progress reporter that prints the
+throughput, queue depth, busy and idle time of the workers and an ETA at
+an interval, and optional cProfile statistics per job that are merged
+into a single profile. Jobs only get wrapped when instrumentation is
+enabled, without it the executors call the functions directly.
+"""
+
+import cProfile
+import os
+import pstats
+import queue
+import socket
+import sys
+import threading
+import time
+
+# records and bytes processed by the current job in this process
+_counters = [0, 0]
+# queue to report the start of jobs on, set in the worker processes
+_events = None
+
+
+def set_events(events):
+    """
+    Sets the queue the jobs run in this process report their start on
+    :param events: queue, or None to not report
+    """
+    global _events
+    _events = events
+
+
+def count(records, size):
+    """
+    Hook for the processing functions to report their work
+    :param records: amount of records processed
+    :param size: amount of bytes processed
+    """
+    _counters[0] += records
+    _counters[1] += size
+
+
+def run_job(job):
+    """
+    Runs a job while measuring its time and work, and profiling it when
+    asked for
+    :param job: tuple of the job id, function, argument, whether to profile
+    and whether to report the start of the job for the progress reports
+    :return: tuple of the job id, result of the function and the job statistics
+    """
+    job_id, fn, arg, profile, report = job
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    if report and _events is not None:
+        _events.put((job_id, worker))
+    _counters[0] = _counters[1] = 0
+    profile_stats = None
+    start = time.perf_counter()
+    if profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, arg)
+        profiler.create_stats()
+        profile_stats = profiler.stats
+    else:
+        result = fn(arg)
+    stats = {'worker': worker,
+             'busy': time.perf_counter() - start,
+             'records': _counters[0],
+             'bytes': _counters[1],
+             'profile': profile_stats}
+    return job_id, result, stats
+
+
+def make_instrumentation(interval=None, profile=None):
+    """
+    Creates the instrumentation for the command line options of the tools
+    :param interval: seconds between the progress reports, None for no reports
+    :param profile: file to write the merged profile to, None to not profile
+    :return: Instrumentation, or None when both are off
+    """
+    if interval is None and profile is None:
+        return None
+    return Instrumentation(interval, profile)
+
+
+class ProfileData:
+    """
+    Statistics of a single job in the form pstats.Stats can load.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Instrumentation:
+    """
+    Collects the statistics of the jobs of an executor, reports the
+    progress every interval and merges the profiles at the end.
+    """
+
+    def __init__(self, interval=None, profile=None, stream=sys.stderr):
+        """
+        :param interval: seconds between the progress reports, None for
+        no reports
+        :param profile: file to write the merged profile to, None to not
+        profile the jobs
+        :param stream: stream to write the reports to
+        """
+        self.interval = interval
+        self.profile = profile
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.profiles = []
+        self.reset()
+
+    def reset(self, total_jobs=0, total_bytes=None, events=None):
+        self.total_jobs = total_jobs
+        self.total_bytes = total_bytes
+        self.events = events
+        self.jobs = 0
+        self.handed_out = 0
+        self.finished = set()
+        self.records = 0
+        self.bytes = 0
+        self.workers = {}
+        self.started = time.perf_counter()
+
+    def wrap(self, fn, args):
+        """
+        :param fn: function to call on every job
+        :param args: list of job arguments
+        :return: list of jobs for run_job
+        """
+        profile = self.profile is not None
+        report = self.interval is not None
+        return [(i, fn, arg, profile, report) for i, arg in enumerate(args)]
+
+    def start(self, total_jobs, sizes=None, events=None):
+        """
+        Starts reporting the progress
+        :param total_jobs: amount of jobs
+        :param sizes: optional list of the sizes in bytes of the jobs, used for the ETA
+        :param events: queue the workers report the start of jobs on, the
+        executors only give it when there is an interval to report at
+        """
+        self.reset(total_jobs, sum(sizes) if sizes else None, events)
+        self.profiles = []
+        self.stopped.clear()
+        if self.interval is not None:
+            self.thread = threading.Thread(target=self.report_loop, daemon=True)
+            self.thread.start()
+
+    def worker(self, name, now):
+        """
+        :param name: name of the worker
+        :param now: time of the first contact with the worker
+        :return: dictionary with the state of the worker
+        """
+        if name not in self.workers:
+            self.workers[name] = {'first_contact': now, 'busy': 0.0, 'jobs': 0, 'current': None}
+        return self.workers[name]
+
+    def job_started(self, job_id, name):
+        """
+        Registers that a worker started a job
+        :param job_id: id of the job
+        :param name: name of the worker
+        """
+        with self.lock:
+            self.handed_out += 1
+            worker = self.worker(name, time.perf_counter())
+            # the result of short jobs can come in before their start
+            if job_id not in self.finished:
+                worker['current'] = (job_id, time.perf_counter())
+
+    def done(self, job_id, stats):
+        """
+        Adds the statistics of a finished job
+        :param job_id: id of the job
+        :param stats: statistics returned by run_job
+        """
+        with self.lock:
+            self.jobs += 1
+            self.finished.add(job_id)
+            self.records += stats['records']
+            self.bytes += stats['bytes']
+            worker = self.worker(stats['worker'], time.perf_counter() - stats['busy'])
+            worker['busy'] += stats['busy']
+            worker['jobs'] += 1
+            if worker['current'] is not None and worker['current'][0] == job_id:
+                worker['current'] = None
+        if stats['profile'] is not None:
+            self.profiles.append(stats['profile'])
+
+    def finish(self):
+        """
+        Stops reporting, writes the final report and the merged profile
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.report()
+        if self.profile is not None and self.profiles:
+            self.write_profile()
+
+    def report_loop(self):
+        """
+        Reports every interval and in between registers the start of jobs
+        as the workers report them
+        """
+        next_report = time.perf_counter() + self.interval
+        while not self.stopped.is_set():
+            timeout = next_report - time.perf_counter()
+            if timeout <= 0:
+                self.report()
+                next_report += self.interval
+            elif self.events is None:
+                self.stopped.wait(timeout)
+            else:
+                try:
+                    self.job_started(*self.events.get(timeout=min(timeout, 0.5)))
+                except queue.Empty:
+                    pass
+                except (EOFError, OSError):
+                    # the server shut down
+                    self.events = None
+
+    def report(self):
+        """
+        Writes the progress, throughput and the busy and idle time per worker
+        """
+        with self.lock:
+            now = time.perf_counter()
+            elapsed = now - self.started
+            # jobs not yet handed out to a worker
+            queue_depth = self.total_jobs - max(self.handed_out, self.jobs)
+            byte_rate = self.bytes / elapsed if elapsed else 0
+            eta = '?'
+            if self.total_bytes and byte_rate:
+                eta = f'{(self.total_bytes - self.bytes) / byte_rate:.0f}s'
+            lines = [f'progress: {self.jobs}/{self.total_jobs} jobs, {self.records} reads '
+                     f'({self.records / elapsed if elapsed else 0:.0f} reads/s), '
+                     f'{self.bytes / 1e6:.1f} MB ({byte_rate / 1e6:.1f} MB/s), '
+                     f'queue {queue_depth}, ETA {eta}']
+            for name, worker in sorted(self.workers.items()):
+                busy = worker['busy']
+                if worker['current'] is not None:
+                    busy += now - worker['current'][1]
+                # idle since the first contact, so startup time doesn't count
+                idle = max(now - worker['first_contact'] - busy, 0)
+                state = 'working' if worker['current'] is not None else 'waiting'
+                lines.append(f'  {name}: {worker["jobs"]} jobs, {state}, busy {busy:.1f}s, '
+                             f'idle {idle:.1f}s')
+        print('\n'.join(lines), file=self.stream, flush=True)
+
+    def write_profile(self):
+        """
+        Merges the profiles of all jobs, writes them to the profile file
+        and prints the most expensive functions
+        """
+        merged = pstats.Stats(ProfileData(self.profiles[0]), stream=self.stream)
+        for stats in self.profiles[1:]:
+            merged.add(ProfileData(stats))
+        merged.dump_stats(self.profile)
+        merged.sort_stats('cumulative').print_stats(20)
@@ -0,0 +1,163 @@
+"""
+Batch mode of the fastq tools: schedules many files of varying size over
+persistent workers on a list of hosts, or on this host for testing, and
+gathers the results of all files.
+"""
+
+import multiprocessing as mp
+import os
+import shlex
+import socket
+import subprocess
+
+from .chunks import chunk_size, plan_chunks
+from .executors import PORTNUM, DistributedExecutor, run_client
+from .processing import merge_results, process_chunks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPLIT_SIZE = 64 * 1024 * 1024
+
+
+class SSHWorkers:
+    """
+    Starts a persistent worker on every host over ssh. The hosts need to
+    see this repository and the fastq files on the same paths.
+    """
+
+    def __init__(self, hosts, processes):
+        """
+        :param hosts: list of (amount of processes or None, hostname) tuples
+        :param processes: amount of processes for hosts without an amount
+        """
+        self.hosts = hosts
+        self.processes = processes
+        self.ssh = []
+
+    def start(self, port):
+        server = socket.getfqdn()
+        for processes, host in self.hosts:
+            command = (f'cd {shlex.quote(ROOT)} && python3 -m fastqcore.worker '
+                       f'--host {shlex.quote(server)} --port {port} -n {processes or self.processes}')
+            self.ssh.append(subprocess.Popen(['ssh', host, command], stdin=subprocess.DEVNULL))
+
+    def alive(self):
+        return any(ssh.poll() is None for ssh in self.ssh)
+
+    def join(self):
+        for ssh in self.ssh:
+            ssh.wait()
+
+
+class LocalWorkers:
+    """
+    Stand-in for the ssh workers that runs one worker with the given
+    amount of processes on this host, through the same server.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.client = None
+
+    def start(self, port):
+        self.client = mp.Process(target=run_client, args=('localhost', port, self.processes))
+        self.client.start()
+
+    def alive(self):
+        return self.client.is_alive()
+
+    def join(self):
+        self.client.join()
+
+
+def read_hosts(hosts_file):
+    """
+    Reads a hosts file with a hostname per line. Like the ssh login files
+    of GNU parallel a line can start with the amount of processes to run
+    on the host, as in 4/nuc101.
+    :param hosts_file: hosts file
+    :return: list of (amount of processes or None, hostname) tuples
+    """
+    hosts = []
+    with open(hosts_file, encoding='UTF-8') as lines:
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            processes, _, host = line.rpartition('/')
+            hosts.append((int(processes) if processes else None, host))
+    return hosts
+
+
+def find_fastq_files(paths):
+    """
+    Collects the fastq files from a list of files and directories,
+    directories are searched recursively
+    :param paths: list of files and directories
+    :return: list of fastq files
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for directory, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                if name.endswith(('.fastq', '.fastq.gz')):
+                    files.append(os.path.join(directory, name))
+    return files
+
+
+def plan_jobs(fastq_files, split_size=SPLIT_SIZE, reader='auto'):
+    """
+    Divides files into jobs of about the split size: large files are split
+    into chunks and small files are packed together. The jobs are sorted
+    from large to small, so the largest ones don't end up last.
+    :param fastq_files: list of fastq files
+    :param split_size: size in bytes to aim for per job
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: list of jobs, each a list of Chunks
+    """
+    jobs = []
+    small = []
+    for fastq_file in fastq_files:
+        size = os.path.getsize(fastq_file)
+        if size >= split_size:
+            chunks_count = -(-size // split_size)
+            jobs.extend([[chunk], chunk_size(chunk)]
+                        for chunk in plan_chunks(fastq_file, chunks_count, reader))
+        else:
+            small.append((size, fastq_file))
+    # pack the small files from large to small into jobs of the split size
+    bundle, bundle_size = [], 0
+    for size, fastq_file in sorted(small, reverse=True):
+        bundle.extend(plan_chunks(fastq_file, 1, reader))
+        bundle_size += size
+        if bundle_size >= split_size:
+            jobs.append([bundle, bundle_size])
+            bundle, bundle_size = [], 0
+    if bundle:
+        jobs.append([bundle, bundle_size])
+    jobs.sort(key=lambda job: job[1], reverse=True)
+    return [chunks for chunks, _ in jobs]
+
+
+def run_batch(fastq_files, accumulator_types, workers, port=PORTNUM, split_size=SPLIT_SIZE,
+              reader='auto', instrumentation=None):
+    """
+    Processes fastq files on persistent workers
+    :param fastq_files: list of fastq files
+    :param accumulator_types: list of accumulator classes to run
+    :param workers: SSHWorkers or LocalWorkers to process the jobs
+    :param port: port to serve the jobs on
+    :param split_size: size in bytes to aim for per job
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :param instrumentation: optional Instrumentation of the jobs
+    :return: dictionary with the file names as keys and the merged
+    accumulators as values, in the order the files were given
+    """
+    tasks = [(chunks, accumulator_types) for chunks in plan_jobs(fastq_files, split_size, reader)]
+    sizes = [sum(chunk_size(chunk) for chunk in chunks) for chunks, _ in tasks]
+    executor = DistributedExecutor(port, workers=workers, instrumentation=instrumentation)
+    results = executor.map(process_chunks, tasks, sizes)
+    merged = merge_results([result for job in results for result in job], accumulator_types)
+    return {fastq_file: merged[fastq_file] for fastq_file in fastq_files}
@@ -0,0 +1,51 @@
+"""
+CSV output of the fastq tools.
+"""
+
+import csv
+import sys
+
+
+def output_file(fastq_file, csvfile, files_count):
+    """
+    Determines the csv file for the results of a fastq file. With multiple
+    input files every file gets its own csv file prefixed with its name,
+    or its name printed above its results on the terminal.
+    :param fastq_file: fastq file the results belong to
+    :param csvfile: csv output file name given by the user or None
+    :param files_count: amount of input files
+    :return: csv output file name or None for the terminal
+    """
+    if files_count > 1:
+        if csvfile is None:
+            print(fastq_file)
+            return None
+        return f'{fastq_file}.{csvfile}'
+    return csvfile
+
+
+def create_output(rows, csvfile, header=None):
+    """
+    Generates csv output files
+    :param rows: rows to write
+    :param csvfile: csv output file name, None writes to the terminal
+    :param header: optional header row
+    """
+    # check if a filename is given
+    if csvfile is None:
+        write_rows(csv.writer(sys.stdout, delimiter=','), rows, header)
+    else:
+        with open(csvfile, 'w', encoding='UTF-8', newline='') as output:
+            write_rows(csv.writer(output, delimiter=','), rows, header)
+
+
+def write_rows(csv_writer, rows, header=None):
+    """
+    Writes the header and rows to a csv writer
+    :param csv_writer: csv writer
+    :param rows: rows to write
+    :param header: optional header row
+    """
+    if header is not None:
+        csv_writer.writerow(header)
+    csv_writer.writerows(rows)
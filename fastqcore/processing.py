@@ -0,0 +1,88 @@
+"""
+Processing of fastq files: planning the chunks, running the accumulators
+over them on an executor and merging the results per file.
+"""
+
+from . import instrumentation
+from .chunks import Chunk, chunk_size, plan_chunks
+from .readers import iter_batches
+
+
+def process_chunk(task):
+    """
+    Runs new accumulators over the records of a chunk
+    :param task: tuple of a Chunk and a list of accumulator classes
+    :return: the chunk, the positions it started and ended reading at and
+    the filled accumulators
+    """
+    chunk, accumulator_types = task
+    accumulators = [accumulator() for accumulator in accumulator_types]
+    records = 0
+    span = []
+    for batch in iter_batches(chunk, span=span):
+        for accumulator in accumulators:
+            accumulator.add_batch(batch)
+        records += len(batch)
+    instrumentation.count(records, chunk_size(chunk))
+    return chunk, span, accumulators
+
+
+def process_chunks(task):
+    """
+    Runs new accumulators over every chunk of a job, used for jobs that
+    pack multiple small files together
+    :param task: tuple of a list of Chunks and a list of accumulator classes
+    :return: list of process_chunk results
+    """
+    chunks, accumulator_types = task
+    return [process_chunk((chunk, accumulator_types)) for chunk in chunks]
+
+
+def merge_results(results, accumulator_types):
+    """
+    Merges the accumulators of chunks belonging to the same file. When the
+    chunks of a file don't line up, the reader skipped lines that weren't
+    part of a record at a chunk border. Such files are read again as a
+    single chunk, so their results don't depend on how they were split.
+    :param results: list of process_chunk results
+    :param accumulator_types: list of accumulator classes that were run
+    :return: dictionary with the file names as keys and the merged
+    accumulators as values, in the order the files were given
+    """
+    chunks = {}
+    for chunk, span, accumulators in results:
+        chunks.setdefault(chunk.path, []).append((chunk, span, accumulators))
+    merged = {}
+    for fastq_file, parts in chunks.items():
+        parts.sort(key=lambda part: part[0].start)
+        previous_end = parts[0][1][1]
+        merged[fastq_file] = parts[0][2]
+        for chunk, (start, end), accumulators in parts[1:]:
+            if start != previous_end:
+                # reread the whole file in this process
+                whole_file = Chunk(fastq_file, 0, None, chunk.reader)
+                merged[fastq_file] = process_chunk((whole_file, accumulator_types))[2]
+                break
+            for total, accumulator in zip(merged[fastq_file], accumulators):
+                total.merge(accumulator)
+            previous_end = end
+    return merged
+
+
+def process_files(fastq_files, accumulator_types, executor, chunks_count, reader='auto'):
+    """
+    Processes fastq files in chunks on an executor
+    :param fastq_files: list of fastq files
+    :param accumulator_types: list of accumulator classes to run
+    :param executor: executor to run the chunks on
+    :param chunks_count: Amount of chunks to split every file into
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: dictionary with the file names as keys and the merged
+    accumulators as values
+    """
+    tasks = []
+    for fastq_file in fastq_files:
+        for chunk in plan_chunks(fastq_file, chunks_count, reader):
+            tasks.append((chunk, accumulator_types))
+    sizes = [chunk_size(chunk) for chunk, _ in tasks]
+    return merge_results(executor.map(process_chunk, tasks, sizes), accumulator_types)
@@ -0,0 +1,185 @@
+"""
+Readers that open fastq files as binary file objects and iterators that
+read the records of a chunk from them, one by one or in batches.
+"""
+
+import gzip
+import mmap
+
+from .batch import RecordBatch
+
+BATCH_SIZE = 10000
+
+
+def open_text(fastq_file):
+    """
+    Opens a plain fastq file as a buffered binary file
+    :param fastq_file: fastq file
+    :return: file object
+    """
+    return open(fastq_file, 'rb')
+
+
+def open_mmap(fastq_file):
+    """
+    Opens a plain fastq file as a read only memory map, which saves the
+    copies of the buffered reader on large files
+    :param fastq_file: fastq file
+    :return: memory map, or a file object when the file is empty
+    """
+    with open(fastq_file, 'rb') as fastq:
+        try:
+            return mmap.mmap(fastq.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return open(fastq_file, 'rb')
+
+
+def open_gzip(fastq_file):
+    """
+    Opens a gzip compressed fastq file
+    :param fastq_file: gzipped fastq file
+    :return: file object with the decompressed data
+    """
+    return gzip.open(fastq_file, 'rb')
+
+
+READERS = {'text': open_text, 'mmap': open_mmap, 'gzip': open_gzip}
+
+
+def reader_name(fastq_file, reader='auto'):
+    """
+    Resolves the reader to use for a file
+    :param fastq_file: fastq file
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: name of the reader
+    """
+    if reader == 'auto':
+        return 'gzip' if fastq_file.endswith('.gz') else 'text'
+    if reader not in READERS:
+        raise ValueError(f'Unknown reader {reader}, choose from {", ".join(READERS)}')
+    return reader
+
+
+def open_reader(fastq_file, reader='auto'):
+    """
+    Opens a fastq file with the given reader
+    :param fastq_file: fastq file
+    :param reader: name of the reader or 'auto' to pick one on the extension
+    :return: binary file object supporting readline, seek and tell
+    """
+    return READERS[reader_name(fastq_file, reader)](fastq_file)
+
+
+def align(fastq, start):
+    """
+    Moves a file object to the first record that starts at or after the
+    given position. A record start is a line starting with '@' of which
+    the second next line starts with '+', quality lines starting with '@'
+    are followed by a header or sequence line instead.
+    :param fastq: binary file object
+    :param start: position in the file
+    :return: position of the first record
+    """
+    # finish the line the start position is in
+    fastq.seek(start - 1)
+    position = start - 1 + len(fastq.readline())
+    lines = []
+    while True:
+        while len(lines) < 3:
+            line = fastq.readline()
+            if not line:
+                # no complete record starts in the rest of the file
+                position += sum(len(line) for line in lines)
+                fastq.seek(position)
+                return position
+            lines.append(line)
+        if lines[0].startswith(b'@') and lines[2].startswith(b'+'):
+            fastq.seek(position)
+            return position
+        position += len(lines.pop(0))
+
+
+def skip_blank_lines(readline):
+    """
+    Skips blank lines
+    :param readline: readline method of the file
+    :return: amount of bytes skipped and the first line that isn't blank,
+    empty at the end of the file
+    """
+    skipped = 0
+    while True:
+        line = readline()
+        if not line or line.strip():
+            return skipped, line
+        skipped += len(line)
+
+
+def iter_records(chunk, span=None):
+    """
+    Reads the records that start within a chunk of a fastq file. The last
+    record is read to its end, even when that lies beyond the chunk.
+    :param chunk: Chunk with the file, start and end position and reader
+    :param span: optional list that receives the position reading started
+    at and the position the last record ended at, see iter_batches
+    :return: generator of (header, sequence, plus, quality) tuples of
+    stripped bytes, lines missing at the end of the file are empty
+    """
+    for batch in iter_batches(chunk, span=span):
+        yield from batch
+
+
+def iter_batches(chunk, batch_size=BATCH_SIZE, span=None):
+    """
+    Reads the records that start within a chunk of a fastq file in
+    batches. The last record is read to its end, even when that lies
+    beyond the chunk.
+    :param chunk: Chunk with the file, start and end position and reader
+    :param batch_size: maximal amount of records per batch
+    :param span: optional list that receives the position reading started
+    at, after aligning, and the position the last record ended at. The
+    chunks of a file line up when every chunk starts where the previous
+    one ended, when they don't align skipped lines that weren't records.
+    :return: generator of RecordBatch objects
+    """
+    with open_reader(chunk.path, chunk.reader) as fastq:
+        position = align(fastq, chunk.start) if chunk.start else 0
+        if span is not None:
+            span[:] = [position, position]
+        readline = fastq.readline
+        while True:
+            batch = RecordBatch()
+            data, offsets = batch.data, batch.offsets
+            for _ in range(batch_size):
+                if chunk.end is not None and position >= chunk.end:
+                    break
+                header = readline()
+                if not header:
+                    # we reached the end of the file
+                    break
+                position += len(header)
+                header = header.rstrip()
+                if not header:
+                    skipped, header = skip_blank_lines(readline)
+                    position += skipped
+                    if not header:
+                        # blank lines at the end of the file end it
+                        break
+                    # blank lines within the file become an empty record
+                    offsets.extend([len(data)] * 4)
+                    if chunk.end is not None and position >= chunk.end:
+                        break
+                    position += len(header)
+                    header = header.rstrip()
+                data += header
+                offsets.append(len(data))
+                for _ in range(3):
+                    line = readline()
+                    position += len(line)
+                    data += line.rstrip()
+                    offsets.append(len(data))
+            if span is not None:
+                span[1] = position
+            if not len(batch):
+                return
+            yield batch
@@ -0,0 +1,27 @@
+"""
+Persistent worker that connects to a batch server and processes its
+jobs until the server runs out of them. Started on every host by the
+launcher as `python3 -m fastqcore.worker`.
+"""
+
+import argparse as ap
+import sys
+
+from .executors import PORTNUM, run_client
+
+
+def main():
+    argparser = ap.ArgumentParser(description="Worker for the batch mode of the fastq tools")
+    argparser.add_argument("-n", action="store", dest="n", type=int, default=1,
+                           help="Amount of worker processes on this host")
+    argparser.add_argument("--host", action="store", type=str, required=True,
+                           help="The hostname where the Server is listening")
+    argparser.add_argument("--port", action="store", type=int, default=PORTNUM,
+                           help="The port on which the Server is listening")
+    args = argparser.parse_args()
+    run_client(args.host, args.port, args.n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Tests of the shared fastq core and the tools built on it.
+"""
+
+import gzip
+import io
+import os
+import pickle
+import queue
+import socket
+import subprocess
+import sys
+import time
+
+import random
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSIGNMENT2 = os.path.join(ROOT, 'Assignment2', 'assignment2.py')
+ASSIGNMENT4 = os.path.join(ROOT, 'Assignment4', 'assignment4.py')
+sys.path.insert(0, ROOT)
+
+from fastqcore import Chunk, Instrumentation, LengthAccumulator, LocalExecutor, PhredAccumulator, RecordBatch, \
+    ValidationAccumulator, iter_batches, iter_records, plan_jobs, process_files, read_hosts
+from fastqcore.batch import QUALITY
+from fastqcore.instrumentation import run_job, set_events
+
+
+def fastq_records(count, length=100):
+    return [f'@read{i}\n{"ACGT" * (length // 4)}\n+\n{"I" * length}\n' for i in range(count)]
+
+
+def validate(fastq_file, chunks_count):
+    output = subprocess.run([sys.executable, ASSIGNMENT4, '-n', str(chunks_count), fastq_file],
+                            capture_output=True, text=True, check=True)
+    return output.stdout
+
+
+@pytest.mark.parametrize('content, row', [
+    (''.join(fastq_records(7)), 'True,100,100,100.0'),
+    # a stray sequence line after the third record
+    (''.join(fastq_records(3)) + 'ACGTACGT\n' + ''.join(fastq_records(4)), 'False,6,100,46.285714285714285'),
+    (''.join(fastq_records(7)) + '\n', 'True,100,100,100.0'),
+    (''.join(fastq_records(7)) + '\n\n', 'True,100,100,100.0'),
+], ids=['valid', 'stray_line', 'blank_line_at_end', 'blank_lines_at_end'])
+def test_validation_independent_of_chunks(tmp_path, content, row):
+    fastq_file = tmp_path / 'reads.fastq'
+    fastq_file.write_text(content)
+    outputs = {chunks_count: validate(str(fastq_file), chunks_count) for chunks_count in range(1, 17)}
+    assert len(set(outputs.values())) == 1, outputs
+    assert outputs[1].splitlines()[-1] == f'{fastq_file},{row}'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        return sock.getsockname()[1]
+
+
+def test_batch_output_is_only_csv(tmp_path):
+    for name in ('a.fastq', 'b.fastq'):
+        (tmp_path / name).write_text(''.join(fastq_records(5)))
+    output = subprocess.run([sys.executable, ASSIGNMENT4, '--local', '2', '--port', str(free_port()),
+                             str(tmp_path)], capture_output=True, text=True, check=True)
+    assert output.stdout.splitlines() == ['"Filenaam,Valide",Min_length,Max_length,Average_length',
+                                          f'{tmp_path / "a.fastq"},True,100,100,100.0',
+                                          f'{tmp_path / "b.fastq"},True,100,100,100.0']
+
+
+def test_server_output_is_only_csv(tmp_path):
+    fastq_file = tmp_path / 'reads.fastq'
+    fastq_file.write_text(''.join(fastq_records(5, length=4)))
+    port = str(free_port())
+    server = subprocess.Popen([sys.executable, ASSIGNMENT2, '-s', '--chunks', '3', '--port', port,
+                               str(fastq_file)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    time.sleep(2)
+    subprocess.run([sys.executable, ASSIGNMENT2, '-c', '--chunks', '1', '-n', '2', '--host', 'localhost',
+                    '--port', port], capture_output=True, check=True, timeout=60)
+    stdout, _ = server.communicate(timeout=60)
+    assert stdout.splitlines() == ['0,40.0', '1,40.0', '2,40.0', '3,40.0']
+
+
+def test_phred_averages(tmp_path):
+    generator = random.Random(1)
+    qualities = []
+    for i in range(200):
+        quality = ''.join(chr(generator.randint(33, 74)) for _ in range(generator.randint(20, 60)))
+        # quality lines that look like headers or plus lines
+        qualities.append('@+'[i % 2] + quality if i % 5 == 0 else quality)
+    content = ''.join(f'@read{i}\n{"A" * len(quality)}\n+\n{quality}\n' for i, quality in enumerate(qualities))
+    sums = [0] * max(map(len, qualities))
+    for quality in qualities:
+        for i, char in enumerate(quality):
+            sums[i] += ord(char) - 33
+    expected = [score / len(qualities) for score in sums]
+    fastq_file = tmp_path / 'reads.fastq'
+    fastq_file.write_text(content)
+    gzip_file = tmp_path / 'reads.fastq.gz'
+    with gzip.open(gzip_file, 'wt') as fastq:
+        fastq.write(content)
+    for path, reader in ((fastq_file, 'text'), (fastq_file, 'mmap'), (gzip_file, 'gzip')):
+        for chunks_count in (1, 2, 3, 7, 16):
+            results = process_files([str(path)], [PhredAccumulator], LocalExecutor(1), chunks_count, reader)
+            assert results[str(path)][0].result() == pytest.approx(expected), (reader, chunks_count)
+
+
+def test_plan_jobs_splits_packs_and_orders(tmp_path):
+    sizes = {'large.fastq': 250, 'a.fastq': 60, 'b.fastq': 50, 'c.fastq': 30, 'd.fastq': 20}
+    for name, size in sizes.items():
+        (tmp_path / name).write_bytes(b'@' * size)
+    files = [str(tmp_path / name) for name in sizes]
+    jobs = plan_jobs(files, split_size=100)
+    large, a, b, c, d = files
+    assert jobs == [
+        # the small files are packed from large to small up to the split size
+        [Chunk(a, 0, 60, 'text'), Chunk(b, 0, 50, 'text')],
+        # the large file is split into ceil(250 / 100) single chunk jobs
+        [Chunk(large, 166, 250, 'text')],
+        [Chunk(large, 0, 83, 'text')],
+        [Chunk(large, 83, 166, 'text')],
+        [Chunk(c, 0, 30, 'text'), Chunk(d, 0, 20, 'text')],
+    ]
+
+
+def test_read_hosts(tmp_path):
+    hosts_file = tmp_path / 'hosts.txt'
+    hosts_file.write_text('assemblix2012\n4/nuc101\n\n# comment\n  nuc102  \n')
+    assert read_hosts(str(hosts_file)) == [(None, 'assemblix2012'), (4, 'nuc101'), (None, 'nuc102')]
+
+
+def test_progress_counts_running_jobs():
+    stream = io.StringIO()
+    instrumentation = Instrumentation(stream=stream)
+    instrumentation.start(3)
+    instrumentation.job_started(0, 'worker')
+    time.sleep(0.2)
+    instrumentation.report()
+    progress, worker = stream.getvalue().splitlines()
+    # the running job is no longer queued and its worker is busy
+    assert 'queue 2' in progress
+    assert 'working' in worker and 'idle 0.0s' in worker
+    instrumentation.done(0, {'worker': 'worker', 'busy': 0.2, 'records': 1, 'bytes': 1, 'profile': None})
+    instrumentation.finish()
+
+
+@pytest.mark.parametrize('interval, events_count', [(None, 0), (1.0, 1)])
+def test_jobs_report_start_only_with_progress(interval, events_count):
+    events = queue.Queue()
+    set_events(events)
+    try:
+        job = Instrumentation(interval, profile='unused.prof').wrap(len, [b'ab'])[0]
+        _, result, stats = run_job(job)
+    finally:
+        set_events(None)
+    assert result == 2
+    assert stats['profile'] is not None
+    assert events.qsize() == events_count
+
+
+@pytest.mark.parametrize('content', [
+    '@a\nACGT\n+\nIIII\n@b\nACGTAC\n+\n#+@III\n',
+    # a blank line, a header without @, lengths that differ and a truncated last record
+    '@a\nACGT\n+\nIIII\n\nb\nACG\n+\nII\n@c\nACGT\n',
+    '@a\nACGT\n+\nIIII\nb\nACGT\n+\nIIII\n',
+    '@a\nACGT\n+\nIII\n',
+    '@a\nACGT\n+\nIIII\n@b\nACGT\n+\n',
+], ids=['valid', 'invalid', 'header', 'lengths', 'truncated'])
+@pytest.mark.parametrize('accumulator_type', [PhredAccumulator, LengthAccumulator, ValidationAccumulator])
+def test_add_batch_matches_add(tmp_path, content, accumulator_type):
+    fastq_file = tmp_path / 'reads.fastq'
+    fastq_file.write_text(content)
+    chunk = Chunk(str(fastq_file), 0, None, 'text')
+    records = list(iter_records(chunk))
+    batches = list(iter_batches(chunk, batch_size=2))
+    assert records == [record for batch in batches for record in batch]
+    by_record = accumulator_type()
+    for record in records:
+        by_record.add(record)
+    by_batch = accumulator_type()
+    for batch in batches:
+        by_batch.add_batch(batch)
+    assert by_batch.result() == by_record.result()
+
+
+@pytest.mark.parametrize('protocol', [4, 5])
+def test_record_batch_pickle(protocol):
+    batch = RecordBatch()
+    batch.append(b'@a', b'ACGT', b'+', b'IIII')
+    batch.append(b'@b', b'AC', b'', b'')
+    buffers = []
+    if protocol == 5:
+        # the buffers go out of band, as when transferring between processes
+        data = pickle.dumps(batch, protocol=protocol, buffer_callback=buffers.append)
+        assert len(buffers) == 2
+    else:
+        data = pickle.dumps(batch, protocol=protocol)
+    copy = pickle.loads(data, buffers=buffers)
+    assert list(copy) == list(batch)
+    assert [bytes(line) for line in copy.lines(QUALITY)] == [b'IIII', b'']
+    copy.append(b'@c', b'G', b'+', b'I')
+    assert list(copy) == list(batch) + [(b'@c', b'G', b'+', b'I')]
+    assert len(batch) == 2